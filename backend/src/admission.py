@@ -0,0 +1,126 @@
+"""Admission control for expensive endpoints.
+
+Each limited endpoint group runs at most ``max_concurrent`` requests at a
+time. Up to ``max_queue`` more wait for a slot for at most
+``queue_timeout`` seconds; anything beyond that is rejected right away
+with 503 and a ``Retry-After`` estimate, instead of piling on work that
+would slow every request down until they all time out.
+
+Limits are per worker process and can be overridden with environment
+variables, e.g. ``FLASHCARDS_MAX_CONCURRENT=2``. With several workers the
+host admits ``workers * max_concurrent`` requests in total. Shedding also
+needs a worker that serves requests concurrently: a gunicorn sync worker
+handles one request at a time, so it never queues or sheds anything.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import jsonify
+
+
+# name -> (max_concurrent, max_queue, queue_timeout seconds, initial service time seconds)
+DEFAULT_LIMITS = {
+    "flashcards": (4, 8, 20.0, 10.0),
+    "pomodoro": (8, 16, 10.0, 3.0),
+}
+
+# Weight of the latest request in the moving average of service time.
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted."""
+
+    # HTTP status of the response, as on werkzeug's HTTPExceptions
+    code = 503
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is overloaded")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded, time-limited wait queue."""
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout, service_time):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.service_time = service_time
+        self._active = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    def retry_after(self):
+        """Seconds until a slot is likely to be free for a new request."""
+        backlog = (self._waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(backlog * self.service_time))
+
+    def _acquire(self):
+        with self._cond:
+            if self._active < self.max_concurrent:
+                self._active += 1
+                return
+            if self._waiting >= self.max_queue:
+                raise Overloaded(self.name, self.retry_after())
+
+            self._waiting += 1
+            try:
+                admitted = self._cond.wait_for(
+                    lambda: self._active < self.max_concurrent, timeout=self.queue_timeout
+                )
+            finally:
+                self._waiting -= 1
+            if not admitted:
+                raise Overloaded(self.name, self.retry_after())
+            self._active += 1
+
+    def _release(self, elapsed):
+        with self._cond:
+            self._active -= 1
+            self.service_time += SERVICE_TIME_SMOOTHING * (elapsed - self.service_time)
+            self._cond.notify()
+
+    @contextmanager
+    def admit(self):
+        """Hold a slot for the duration of the block, or raise Overloaded."""
+        self._acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start)
+
+
+def _from_env(name):
+    max_concurrent, max_queue, queue_timeout, service_time = DEFAULT_LIMITS[name]
+    prefix = name.upper()
+    return AdmissionController(
+        name,
+        int(os.getenv(f"{prefix}_MAX_CONCURRENT", max_concurrent)),
+        int(os.getenv(f"{prefix}_MAX_QUEUE", max_queue)),
+        float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", queue_timeout)),
+        service_time,
+    )
+
+
+controllers = {name: _from_env(name) for name in DEFAULT_LIMITS}
+
+
+def admit(name):
+    """Context manager admitting the current request into the ``name`` group."""
+    return controllers[name].admit()
+
+
+def overloaded_response(error):
+    """503 response for an Overloaded error."""
+    response = jsonify({"error": "Server is busy, please retry later", "retryAfter": error.retry_after})
+    response.status_code = error.code
+    response.headers['Retry-After'] = str(error.retry_after)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
@@ -1,7 +1,13 @@
 import os
-from datetime import datetime
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from elevenlabs import set_api_key, generate, Voice, VoiceSettings
 from dotenv import load_dotenv
+from admission import controllers
+from services.audio_encoding import store_clip
+from services.cache import get_cache
 
 # Load environment variables
 load_dotenv()
@@ -23,44 +29,100 @@ DEFAULT_VOICE_SETTINGS = VoiceSettings(
     style=0.0,
     use_speaker_boost=True,
 )
+TTS_MODEL = "eleven_monolingual_v1"
+AUDIO_CACHE_TTL = 7 * 24 * 3600
+AUDIO_DIR = "audio_files"
+VOICE_CATALOG_KEY = "voices:catalog"
+VOICE_CATALOG_TTL = 3600
+# After a failed fetch, wait this long before asking ElevenLabs again
+VOICE_CATALOG_RETRY = 60
+
+# Generates the two clips of a session side by side, for every admitted session
+_session_executor = ThreadPoolExecutor(
+    max_workers=controllers["pomodoro"].max_concurrent * 2, thread_name_prefix="session-audio"
+)
+# Speculative pre-rendering; kept small so it never competes with real requests
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="audio-prefetch")
+_prefetching = set()
+_prefetching_lock = threading.Lock()
+
+def audio_cache_key(text, voice_id, voice_settings):
+    """Cache key for a clip; the same text, voice and settings give the same audio"""
+    raw = "\x00".join([TTS_MODEL, voice_id, repr(voice_settings), text])
+    return "audio:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 def generate_audio(text, voice_id=DEFAULT_VOICE_ID, voice_settings=None):
-    """Generate audio using ElevenLabs API"""
+    """Generate audio using ElevenLabs API, reusing cached clips across workers"""
+    voice_id = voice_id or DEFAULT_VOICE_ID
+    voice_settings = voice_settings or DEFAULT_VOICE_SETTINGS
+
+    def synthesize():
+        try:
+            # Create voice object with settings
+            voice = Voice(
+                voice_id=voice_id,
+                settings=voice_settings
+            )
+
+            return generate(
+                text=text,
+                voice=voice,
+                model=TTS_MODEL
+            )
+
+        except Exception as e:
+            print(f"Error generating audio: {e}")
+            return None
+
+    synthesized = []
+
+    def synthesize_once():
+        synthesized.append(synthesize())
+        return synthesized[-1]
+
+    key = audio_cache_key(text, voice_id, voice_settings)
     try:
-        # Create voice object with settings
-        voice = Voice(
-            voice_id=voice_id,
-            settings=voice_settings or DEFAULT_VOICE_SETTINGS
-        )
-        
-        audio = generate(
-            text=text,
-            voice=voice,
-            model="eleven_monolingual_v1"
-        )
-        
-        return audio
-        
+        return get_cache().get_or_set(key, synthesize_once, ttl=AUDIO_CACHE_TTL)
     except Exception as e:
-        print(f"Error generating audio: {e}")
-        return None
+        # A cache or lock failure must not cost the clip; keep the old contract
+        print(f"Audio cache unavailable, generating directly: {e}")
+        return synthesized[-1] if synthesized else synthesize()
 
 def save_audio(audio_content, filename):
-    """Save audio content to file"""
-    audio_dir = "audio_files"
-    os.makedirs(audio_dir, exist_ok=True)
+    """Save audio content to file, normalizing loudness and encoding compact variants"""
+    os.makedirs(AUDIO_DIR, exist_ok=True)
     
-    filepath = os.path.join(audio_dir, filename)
+    filepath = os.path.join(AUDIO_DIR, filename)
     
     try:
-        with open(filepath, "wb") as f:
-            f.write(audio_content)
+        store_clip(audio_content, filepath)
         return filepath, filename
     except Exception as e:
         print(f"Error saving audio: {e}")
         return None, None
 
-def start_sound(text=DEFAULT_START_TEXT, voice_id=DEFAULT_VOICE_ID, voice_settings=None):
+def _clip(prefix, text, voice_id, voice_settings, cached_only=False):
+    """Return the stored clip for these parameters, generating it on first use"""
+    voice_id = voice_id or DEFAULT_VOICE_ID
+    voice_settings = voice_settings or DEFAULT_VOICE_SETTINGS
+
+    # Clips are named by content so each one is generated and encoded once
+    digest = audio_cache_key(text, voice_id, voice_settings).split(":", 1)[1]
+    filename = f"{prefix}_{digest[:20]}.mp3"
+    filepath = os.path.join(AUDIO_DIR, filename)
+    if os.path.exists(filepath):
+        return filepath, filename
+    if cached_only:
+        return None, None
+
+    audio_content = generate_audio(text, voice_id, voice_settings)
+    
+    if audio_content:
+        return save_audio(audio_content, filename)
+    else:
+        return None, None
+
+def start_sound(text=DEFAULT_START_TEXT, voice_id=DEFAULT_VOICE_ID, voice_settings=None, cached_only=False):
     """
     Generate and save pomodoro start sound
     
@@ -68,21 +130,14 @@ def start_sound(text=DEFAULT_START_TEXT, voice_id=DEFAULT_VOICE_ID, voice_settin
         text (str): The text for the start sound
         voice_id (str): The voice ID to use
         voice_settings (VoiceSettings): Voice settings for the TTS
+        cached_only (bool): Only return an already stored clip, never call the API
     
     Returns:
         tuple: (filepath, filename) or (None, None) if failed
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"pomodoro_start_{timestamp}.mp3"
-    
-    audio_content = generate_audio(text, voice_id, voice_settings)
-    
-    if audio_content:
-        return save_audio(audio_content, filename)
-    else:
-        return None, None
+    return _clip("pomodoro_start", text, voice_id, voice_settings, cached_only)
 
-def end_sound(text=DEFAULT_END_TEXT, voice_id=DEFAULT_VOICE_ID, voice_settings=None):
+def end_sound(text=DEFAULT_END_TEXT, voice_id=DEFAULT_VOICE_ID, voice_settings=None, cached_only=False):
     """
     Generate and save pomodoro end sound
     
@@ -90,21 +145,60 @@ def end_sound(text=DEFAULT_END_TEXT, voice_id=DEFAULT_VOICE_ID, voice_settings=N
         text (str): The text for the end sound
         voice_id (str): The voice ID to use
         voice_settings (VoiceSettings): Voice settings for the TTS
+        cached_only (bool): Only return an already stored clip, never call the API
     
     Returns:
         tuple: (filepath, filename) or (None, None) if failed
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"pomodoro_end_{timestamp}.mp3"
-    
-    audio_content = generate_audio(text, voice_id, voice_settings)
-    
-    if audio_content:
-        return save_audio(audio_content, filename)
-    else:
-        return None, None
+    return _clip("pomodoro_end", text, voice_id, voice_settings, cached_only)
+
+def session_sounds(voice_id=DEFAULT_VOICE_ID, voice_settings=None, cached_only=False):
+    """
+    Generate start and end sounds for a session concurrently
+
+    With cached_only the stored clips are looked up directly, without
+    going through the generation pool.
+
+    Returns:
+        tuple: ((start_path, start_filename), (end_path, end_filename))
+    """
+    if cached_only:
+        return (
+            start_sound(voice_id=voice_id, voice_settings=voice_settings, cached_only=True),
+            end_sound(voice_id=voice_id, voice_settings=voice_settings, cached_only=True),
+        )
+    start = _session_executor.submit(start_sound, voice_id=voice_id, voice_settings=voice_settings)
+    end = _session_executor.submit(end_sound, voice_id=voice_id, voice_settings=voice_settings)
+    return start.result(), end.result()
+
+def prefetch_sound(sound, voice_id=DEFAULT_VOICE_ID, voice_settings=None):
+    """
+    Render a clip in the background so a later request finds it stored
+
+    Args:
+        sound (callable): start_sound or end_sound
+        voice_id (str): The voice ID to use
+        voice_settings (VoiceSettings): Voice settings for the TTS
+    """
+    if sound(voice_id=voice_id, voice_settings=voice_settings, cached_only=True)[0]:
+        return
+
+    key = (sound.__name__, voice_id, repr(voice_settings))
+    with _prefetching_lock:
+        if key in _prefetching:
+            return
+        _prefetching.add(key)
+
+    def run():
+        try:
+            sound(voice_id=voice_id, voice_settings=voice_settings)
+        finally:
+            with _prefetching_lock:
+                _prefetching.discard(key)
+
+    _prefetch_executor.submit(run)
+
 
-# Additional helper function to list available voices
 def list_voices():
     """
     List all available voices
@@ -117,6 +211,103 @@ def list_voices():
         print(f"Error fetching voices: {e}")
         return []
 
+_catalog_refresh = threading.Lock()
+
+def _refresh_voice_catalog(stale=None):
+    """
+    Fetch the voice list and store it in the shared cache
+
+    A failed fetch is cached too, so callers do not hit ElevenLabs on every
+    request while it is down: the stale list is kept if there is one,
+    otherwise an empty list is stored, and either is retried after
+    VOICE_CATALOG_RETRY seconds.
+    """
+    voices_list = list_voices()
+    ttl = None
+    if voices_list:
+        catalog = {"voices": voices_list, "fetched_at": time.time()}
+    elif stale:
+        catalog = {"voices": stale["voices"], "fetched_at": time.time() - VOICE_CATALOG_TTL + VOICE_CATALOG_RETRY}
+    else:
+        catalog = {"voices": [], "fetched_at": time.time()}
+        ttl = VOICE_CATALOG_RETRY
+    try:
+        get_cache().set(VOICE_CATALOG_KEY, catalog, ttl=ttl)
+    except Exception as e:
+        print(f"Voice catalog cache unavailable: {e}")
+    return catalog
+
+def _refresh_voice_catalog_in_background(stale):
+    # Only one refresh per process at a time; others keep serving the stale list
+    if not _catalog_refresh.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            _refresh_voice_catalog(stale)
+        finally:
+            _catalog_refresh.release()
+
+    threading.Thread(target=run, name="voice-catalog-refresh", daemon=True).start()
+
+def get_voice_catalog():
+    """
+    Return available voices from the cache
+
+    The list is fetched synchronously only when nothing is cached. Once it
+    is older than VOICE_CATALOG_TTL it is still returned while a background
+    thread fetches a fresh copy. A failed fetch is remembered for
+    VOICE_CATALOG_RETRY seconds.
+
+    Returns:
+        list: [{"voice_id": ..., "name": ...}, ...], empty if unavailable
+    """
+    try:
+        catalog = get_cache().get(VOICE_CATALOG_KEY)
+    except Exception as e:
+        # Fail open like an unavailable catalog instead of failing the request
+        print(f"Voice catalog cache unavailable: {e}")
+        catalog = None
+    if catalog is None:
+        return _refresh_voice_catalog()["voices"]
+    if time.time() - catalog["fetched_at"] > VOICE_CATALOG_TTL:
+        _refresh_voice_catalog_in_background(catalog)
+    return catalog["voices"]
+
+def is_known_voice(voice_id):
+    """Check a voice ID against the cached catalog; unknown if the catalog is unavailable"""
+    catalog = get_voice_catalog()
+    if not catalog:
+        return True
+    return any(voice["voice_id"] == voice_id for voice in catalog)
+
+def voice_settings_from_request(settings):
+    """
+    Build VoiceSettings from the frontend's voiceSettings object
+
+    Args:
+        settings (dict): stability, similarityBoost, style (0-1) and speakerBoost;
+            missing fields use the defaults
+
+    Returns:
+        VoiceSettings
+
+    Raises:
+        ValueError: If a value is out of range or has the wrong type
+    """
+    fields = {
+        "stability": settings.get("stability", DEFAULT_VOICE_SETTINGS.stability),
+        "similarity_boost": settings.get("similarityBoost", DEFAULT_VOICE_SETTINGS.similarity_boost),
+        "style": settings.get("style", DEFAULT_VOICE_SETTINGS.style),
+    }
+    for name, value in fields.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1:
+            raise ValueError(f"{name} must be a number between 0 and 1")
+    speaker_boost = settings.get("speakerBoost", DEFAULT_VOICE_SETTINGS.use_speaker_boost)
+    if not isinstance(speaker_boost, bool):
+        raise ValueError("speakerBoost must be true or false")
+    return VoiceSettings(use_speaker_boost=speaker_boost, **fields)
+
 # For testing purposes
 if __name__ == "__main__":
     print("Testing ElevenLabs audio generation with SDK...")
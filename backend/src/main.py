@@ -1,11 +1,24 @@
+import os
+from dotenv import load_dotenv
 from flask import Flask
 from flask_cors import CORS
 
+load_dotenv()
+
 def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = "SECRET_KEY"
     app.config['UPLOAD_FOLDER'] = "Uploads"
 
+    # On-demand profiling, see profiling.py
+    app.config['PROFILING_ENABLED'] = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+    app.config['PROFILING_TOKEN'] = os.getenv("PROFILING_TOKEN")
+    app.config['PROFILE_HEADER'] = "X-Profile"
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    app.config['PROFILE_INTERVAL_MS'] = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    app.config['PROFILE_DIR'] = os.getenv("PROFILE_DIR", "profiles")
+    app.config['PROFILE_DIR_MAX_BYTES'] = int(os.getenv("PROFILE_DIR_MAX_BYTES", str(50 * 1024 * 1024)))
+
     # Allow CORS on all endpoints
     CORS(app, supports_credentials=True, origins="*")
 
@@ -0,0 +1,180 @@
+"""On-demand per-request profiling.
+
+When ``PROFILING_ENABLED`` is set in the app config, a request is profiled
+if it carries the profiling header (``X-Profile: 1``, or the value of
+``PROFILING_TOKEN`` when one is configured) or is picked by random
+sampling at ``PROFILE_SAMPLE_RATE``.
+
+A profile samples the stack of the thread serving the request every
+``PROFILE_INTERVAL_MS`` from a timer thread, so other requests running
+in the same process never show up in it (a tracing profiler such as
+cProfile sees every thread on Python 3.12). Stacks are written to
+``PROFILE_DIR`` in collapsed format, one ``frame;frame;... count`` line
+per distinct stack, next to a ``.json`` file with the request metadata;
+the oldest profiles are deleted once the directory exceeds
+``PROFILE_DIR_MAX_BYTES``. Open a ``.folded`` file in speedscope or
+render it with ``flamegraph.pl``.
+
+Only one request per process is profiled at a time, which keeps the
+overhead of sampling bounded.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+
+from flask import after_this_request, current_app, request
+
+
+_profiler_lock = threading.Lock()
+
+
+class _StackSampler:
+    """Counts the stacks of one thread below ``root``, sampled on a timer thread."""
+
+    def __init__(self, thread_id, root, interval):
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.root:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            # Skip samples taken outside the view, e.g. before it was entered
+            if frame is not None and stack:
+                self.stacks[";".join(reversed(stack))] += 1
+            del frame
+
+
+def _should_profile(config):
+    if not config.get("PROFILING_ENABLED"):
+        return False
+    header = request.headers.get(config.get("PROFILE_HEADER", "X-Profile"))
+    if header:
+        token = config.get("PROFILING_TOKEN")
+        return header == token if token else header == "1"
+    return random.random() < config.get("PROFILE_SAMPLE_RATE", 0.0)
+
+
+def _request_metadata():
+    upload = next(iter(request.files.values()), None)
+    return {
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "args": request.args.to_dict(),
+        "contentType": request.content_type,
+        "contentLength": request.content_length,
+        "filename": upload.filename if upload else None,
+        "pid": os.getpid(),
+    }
+
+
+def _enforce_size_cap(directory, max_bytes):
+    """Delete the oldest profiles until the directory fits in ``max_bytes``."""
+    # profile id -> [oldest mtime, total size, paths]
+    profiles = {}
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entry = profiles.setdefault(os.path.splitext(name)[0], [stat.st_mtime, 0, []])
+        entry[0] = min(entry[0], stat.st_mtime)
+        entry[1] += stat.st_size
+        entry[2].append(path)
+
+    total = sum(size for _, size, _ in profiles.values())
+    for _, size, paths in sorted(profiles.values()):
+        if total <= max_bytes:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def _write_profile(config, sampler, metadata):
+    directory = config.get("PROFILE_DIR", "profiles")
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, metadata["id"])
+
+    with open(base + ".folded", "w") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(base + ".json", "w") as f:
+        json.dump(metadata, f, indent=2, default=str)
+
+    _enforce_size_cap(directory, config.get("PROFILE_DIR_MAX_BYTES", 50 * 1024 * 1024))
+
+
+def _profile_id_header(profile_id):
+    """``after_this_request`` hook tagging the response, error responses included."""
+    def add_header(response):
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+    return add_header
+
+
+def profiled(view):
+    """Decorator sampling a view's stack when profiling is requested."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        config = current_app.config
+        if not _should_profile(config) or not _profiler_lock.acquire(blocking=False):
+            return view(*args, **kwargs)
+
+        try:
+            metadata = _request_metadata()
+            metadata["id"] = f"{time.strftime('%Y%m%d_%H%M%S')}_{request.endpoint}_{uuid.uuid4().hex[:8]}"
+            interval_ms = config.get("PROFILE_INTERVAL_MS", 5)
+            sampler = _StackSampler(threading.get_ident(), sys._getframe(), interval_ms / 1000)
+            start = time.perf_counter()
+            status = None
+            try:
+                with sampler:
+                    response = current_app.make_response(view(*args, **kwargs))
+                status = response.status_code
+                return response
+            except Exception as e:
+                # abort() and Overloaded end up as error responses; profile them too
+                status = getattr(e, "code", None) or 500
+                metadata["exception"] = type(e).__name__
+                raise
+            finally:
+                metadata["durationMs"] = round((time.perf_counter() - start) * 1000, 1)
+                metadata["status"] = status
+                metadata["intervalMs"] = interval_ms
+                metadata["samples"] = sum(sampler.stacks.values())
+                try:
+                    _write_profile(config, sampler, metadata)
+                    after_this_request(_profile_id_header(metadata["id"]))
+                except OSError as write_error:
+                    print(f"Error writing profile: {write_error}")
+        finally:
+            _profiler_lock.release()
+    return wrapper
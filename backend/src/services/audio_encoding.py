@@ -0,0 +1,124 @@
+"""Audio post-processing for pomodoro clips.
+
+When a clip is stored its loudness is normalized once, and compact
+variants are encoded next to it, so serving a clip is just picking the
+right file. Notification clips are short mono speech, which survives
+low-bitrate MP3 or Opus with little audible loss at a fraction of the
+size of the ElevenLabs default.
+
+Encoding uses the ``ffmpeg`` binary when it is on PATH. Without it clips
+are stored as received and only the original format is served.
+"""
+import os
+import shutil
+import subprocess
+import uuid
+from typing import Dict, List, Optional
+
+
+FFMPEG = shutil.which("ffmpeg")
+FFMPEG_TIMEOUT = 30
+
+# EBU R128 loudness target, applied to the original before encoding variants.
+LOUDNORM_FILTER = "loudnorm=I=-16:TP=-1.5:LRA=11"
+
+DEFAULT_FORMAT = "mp3"
+
+# Format name -> file suffix, MIME type and ffmpeg encoder arguments.
+AUDIO_FORMATS: Dict[str, Dict] = {
+    "mp3": {
+        "suffix": ".mp3",
+        "mimetype": "audio/mpeg",
+        "args": ["-c:a", "libmp3lame", "-b:a", "128k"],
+    },
+    "mp3-low": {
+        "suffix": ".low.mp3",
+        "mimetype": "audio/mpeg",
+        "args": ["-c:a", "libmp3lame", "-b:a", "48k", "-ac", "1"],
+    },
+    "opus": {
+        "suffix": ".ogg",
+        "mimetype": "audio/ogg",
+        "args": ["-c:a", "libopus", "-b:a", "24k", "-ac", "1", "-application", "voip"],
+    },
+}
+
+
+def variant_filename(filename: str, fmt: str) -> str:
+    """Name of the ``fmt`` variant stored next to ``filename``."""
+    stem = filename[:-len(AUDIO_FORMATS[DEFAULT_FORMAT]["suffix"])]
+    return stem + AUDIO_FORMATS[fmt]["suffix"]
+
+
+def negotiate_format(requested: Optional[str], accepted: List[str], save_data: bool) -> str:
+    """Pick the audio format to serve.
+
+    Args:
+        requested: Explicit ``format`` query parameter, if any
+        accepted: MIME types the client lists explicitly in ``Accept``
+        save_data: Whether the client sent ``Save-Data: on``
+
+    Returns:
+        A key of ``AUDIO_FORMATS``
+    """
+    if requested in AUDIO_FORMATS:
+        return requested
+    # Only serve Ogg to clients that name it; "*/*" is sent by browsers
+    # that cannot play Opus.
+    if "audio/ogg" in accepted or "audio/opus" in accepted:
+        return "opus"
+    if save_data:
+        return "mp3-low"
+    return DEFAULT_FORMAT
+
+
+def _ffmpeg(src: str, dest: str, args: List[str]) -> None:
+    subprocess.run(
+        [FFMPEG, "-y", "-loglevel", "error", "-i", src, *args, dest],
+        check=True,
+        capture_output=True,
+        timeout=FFMPEG_TIMEOUT,
+    )
+
+
+def store_clip(audio_content: bytes, filepath: str) -> None:
+    """Store a clip at ``filepath`` with its loudness normalized and variants encoded.
+
+    Every file is encoded under a temporary name and only renamed into
+    place once all encodes succeeded, the original last, so once
+    ``filepath`` exists all variants do too. If any encode fails, the
+    clip is stored as received with no variants.
+    """
+    # Unique temp names, since several threads or workers may store the same clip
+    tag = uuid.uuid4().hex[:12]
+    tmp_raw = f"{filepath}.{tag}.raw"
+    with open(tmp_raw, "wb") as f:
+        f.write(audio_content)
+
+    if not FFMPEG:
+        os.replace(tmp_raw, filepath)
+        return
+
+    directory, filename = os.path.split(filepath)
+    tmp_original = f"{filepath}.{tag}.tmp.mp3"
+    # (final path, temp path, encoder args) of each variant
+    variants = []
+    for fmt, spec in AUDIO_FORMATS.items():
+        if fmt != DEFAULT_FORMAT:
+            variant_path = os.path.join(directory, variant_filename(filename, fmt))
+            variants.append((variant_path, f"{variant_path}.{tag}.tmp{spec['suffix']}", spec["args"]))
+    try:
+        _ffmpeg(tmp_raw, tmp_original, ["-af", LOUDNORM_FILTER, *AUDIO_FORMATS[DEFAULT_FORMAT]["args"]])
+        for _, tmp_variant, args in variants:
+            _ffmpeg(tmp_original, tmp_variant, args)
+        # Publish only once every encode succeeded, so all formats share one loudness
+        for variant_path, tmp_variant, _ in variants:
+            os.replace(tmp_variant, variant_path)
+        os.replace(tmp_original, filepath)
+    except (subprocess.SubprocessError, OSError) as e:
+        print(f"Error encoding audio, storing original: {e}")
+        os.replace(tmp_raw, filepath)
+    finally:
+        for leftover in (tmp_raw, tmp_original, *(tmp for _, tmp, _ in variants)):
+            if os.path.exists(leftover):
+                os.remove(leftover)
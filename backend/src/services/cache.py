@@ -0,0 +1,225 @@
+"""Pluggable cache backends.
+
+``MemoryCache`` keeps entries in the current process. ``SQLiteCache``
+keeps them in a SQLite file, so every worker process on a host shares
+one cache: a clip generated by one gunicorn worker is a hit for all the
+others. Writes are single transactions, so readers never see a partial
+value, and ``lock`` gives a cross-process mutex used by ``get_or_set``
+to stop several workers computing the same value at once.
+
+The backend is chosen with ``CACHE_BACKEND`` (``sqlite`` or ``memory``);
+``get_cache`` returns the process-wide instance.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
+CACHE_PATH = os.getenv(
+    "CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', '..', 'cache.db'),
+)
+
+# How long a cross-process lock is held before others may break it, and
+# how long ``lock`` waits for it.
+LOCK_LEASE = 60.0
+LOCK_TIMEOUT = 90.0
+LOCK_POLL_INTERVAL = 0.05
+
+# Expired SQLite entries are purged after every PURGE_EVERY writes.
+PURGE_EVERY = 200
+
+
+class CacheBackend:
+    """Interface shared by all cache backends."""
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def lock(self, name: str):
+        """Context manager holding an exclusive lock on ``name``."""
+        raise NotImplementedError
+
+    def get_or_set(self, key: str, factory: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Return the cached value for ``key``, computing it at most once.
+
+        ``factory`` runs under ``lock(key)`` so concurrent callers wait for
+        the first one instead of repeating its work. A ``None`` result is
+        returned but not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self.lock(key):
+            value = self.get(key)
+            if value is None:
+                value = factory()
+                if value is not None:
+                    self.set(key, value, ttl)
+            return value
+
+
+class MemoryCache(CacheBackend):
+    """Thread-safe in-process cache."""
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._mutex = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._mutex:
+            self._entries[key] = (value, expires_at)
+
+    def delete(self, key):
+        with self._mutex:
+            self._entries.pop(key, None)
+
+    @contextmanager
+    def lock(self, name):
+        # name -> [lock, holders and waiters]; dropped when nobody uses it
+        with self._mutex:
+            entry = self._locks.setdefault(name, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._mutex:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[name]
+
+
+class SQLiteCache(CacheBackend):
+    """Cache shared by all processes on a host through a SQLite file."""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at);
+            CREATE TABLE IF NOT EXISTS cache_locks (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes SQLite's write lock up front."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, blob, expires_at),
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    @contextmanager
+    def lock(self, name):
+        """Cross-process mutex backed by a lease row in the cache database."""
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            with self._transaction() as conn:
+                now = time.time()
+                conn.execute("DELETE FROM cache_locks WHERE name = ? AND expires_at <= ?", (name, now))
+                acquired = conn.execute(
+                    "INSERT OR IGNORE INTO cache_locks (name, owner, expires_at) VALUES (?, ?, ?)",
+                    (name, owner, now + LOCK_LEASE),
+                ).rowcount == 1
+            if acquired:
+                break
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for cache lock {name!r}")
+            time.sleep(LOCK_POLL_INTERVAL)
+
+        try:
+            yield
+        finally:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM cache_locks WHERE name = ? AND owner = ?", (name, owner))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    """Return the process-wide cache backend selected by ``CACHE_BACKEND``."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if CACHE_BACKEND == "memory":
+                _cache = MemoryCache()
+            elif CACHE_BACKEND == "sqlite":
+                _cache = SQLiteCache()
+            else:
+                raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}")
+        return _cache
@@ -0,0 +1,272 @@
+"""Persistent flashcard deck store.
+
+Generated decks are saved to an embedded SQLite database with an FTS5
+index over card fronts and backs, so old decks can be listed, fetched
+and searched instead of paying Gemini to regenerate them.
+
+Saving is asynchronous: ``save_deck`` assigns an id and queues the deck,
+and a background writer commits queued decks in batches. Decks that are
+queued but not yet written are flushed before ``get_deck`` reads them,
+so a deck always comes back in the same shape, card ids included.
+"""
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+
+DECK_DB_PATH = os.getenv(
+    "DECK_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', '..', 'decks.db'),
+)
+
+# Writer batching: commit once this many decks are queued, or after
+# FLUSH_INTERVAL seconds, whichever comes first.
+WRITE_BATCH_SIZE = 32
+FLUSH_INTERVAL = 0.5
+
+# A failed batch is retried with exponential backoff, then written deck by
+# deck so one bad deck cannot take the rest of the batch down with it.
+WRITE_RETRIES = 3
+RETRY_BACKOFF = 0.5
+
+# How long reads of a queued deck, and the exit-time flush, wait for the writer.
+READ_FLUSH_TIMEOUT = 5.0
+EXIT_FLUSH_TIMEOUT = 10.0
+
+MAX_PAGE_SIZE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS decks (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    card_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS decks_created_at ON decks (created_at);
+
+CREATE TABLE IF NOT EXISTS cards (
+    id INTEGER PRIMARY KEY,
+    deck_id TEXT NOT NULL REFERENCES decks (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    front TEXT NOT NULL,
+    back TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cards_deck_position ON cards (deck_id, position);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5 (
+    front, back, content='cards', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS cards_fts_insert AFTER INSERT ON cards BEGIN
+    INSERT INTO cards_fts (rowid, front, back) VALUES (new.id, new.front, new.back);
+END;
+CREATE TRIGGER IF NOT EXISTS cards_fts_delete AFTER DELETE ON cards BEGIN
+    INSERT INTO cards_fts (cards_fts, rowid, front, back)
+    VALUES ('delete', old.id, old.front, old.back);
+END;
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a connection to the deck database with the settings we rely on."""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query matching all of its terms."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+
+def _deck_summary(row) -> Dict:
+    return {
+        "deckId": row["id"],
+        "title": row["title"],
+        "source": row["source"],
+        "createdAt": row["created_at"],
+        "cardCount": row["card_count"],
+    }
+
+
+class DeckStore:
+    """SQLite-backed deck storage with a batching background writer."""
+
+    def __init__(self, path: str = DECK_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._written = threading.Condition(self._pending_lock)
+
+        with connect(path) as conn:
+            conn.executescript(SCHEMA)
+
+        self._writer = threading.Thread(target=self._write_loop, name="deck-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush, EXIT_FLUSH_TIMEOUT)
+
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread read connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def save_deck(self, flashcards: List[Dict], source: str, title: str) -> str:
+        """Queue a deck for saving and return its id immediately."""
+        deck = {
+            "deckId": uuid.uuid4().hex,
+            "title": title,
+            "source": source,
+            "createdAt": time.time(),
+            "cardCount": len(flashcards),
+            "flashcards": [{"front": card["front"], "back": card["back"]} for card in flashcards],
+        }
+        with self._pending_lock:
+            self._pending[deck["deckId"]] = deck
+        self._queue.put(deck)
+        return deck["deckId"]
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued deck has been written or given up on.
+
+        Returns:
+            False if ``timeout`` expired first
+        """
+        with self._written:
+            return self._written.wait_for(lambda: not self._pending, timeout)
+
+    def _write_loop(self) -> None:
+        conn = connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_with_retries(conn, batch)
+            except Exception as e:
+                # Never let the writer die; the decks are reported as lost
+                print(f"Error saving decks {[d['deckId'] for d in batch]}: {e}")
+            finally:
+                with self._written:
+                    for deck in batch:
+                        self._pending.pop(deck["deckId"], None)
+                    self._written.notify_all()
+
+    def _write_with_retries(self, conn: sqlite3.Connection, batch: List[Dict]) -> None:
+        for attempt in range(WRITE_RETRIES):
+            try:
+                self._write_batch(conn, batch)
+                return
+            except Exception as e:
+                print(f"Error saving deck batch (attempt {attempt + 1}/{WRITE_RETRIES}): {e}")
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+        for deck in batch:
+            try:
+                self._write_batch(conn, [deck])
+            except Exception as e:
+                print(f"Giving up on deck {deck['deckId']}: {e}")
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Dict]) -> None:
+        with conn:
+            conn.executemany(
+                "INSERT INTO decks (id, title, source, created_at, card_count) VALUES (?, ?, ?, ?, ?)",
+                [(d["deckId"], d["title"], d["source"], d["createdAt"], d["cardCount"]) for d in batch],
+            )
+            conn.executemany(
+                "INSERT INTO cards (deck_id, position, front, back) VALUES (?, ?, ?, ?)",
+                [
+                    (d["deckId"], position, card["front"], card["back"])
+                    for d in batch
+                    for position, card in enumerate(d["flashcards"])
+                ],
+            )
+
+    def get_deck(self, deck_id: str) -> Optional[Dict]:
+        """Fetch a deck with its cards, or None if it does not exist."""
+        # Wait for a queued deck to be written, so it has card ids like any other
+        with self._written:
+            self._written.wait_for(lambda: deck_id not in self._pending, READ_FLUSH_TIMEOUT)
+
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM decks WHERE id = ?", (deck_id,)).fetchone()
+        if row is None:
+            return None
+        deck = _deck_summary(row)
+        deck["flashcards"] = [
+            {"cardId": card["id"], "front": card["front"], "back": card["back"]}
+            for card in conn.execute(
+                "SELECT id, front, back FROM cards WHERE deck_id = ? ORDER BY position", (deck_id,)
+            )
+        ]
+        return deck
+
+    def list_decks(self, page: int = 1, per_page: int = 20) -> Dict:
+        """List saved decks, newest first."""
+        per_page = min(per_page, MAX_PAGE_SIZE)
+        conn = self._conn()
+        total = conn.execute("SELECT COUNT(*) FROM decks").fetchone()[0]
+        rows = conn.execute(
+            "SELECT * FROM decks ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (per_page, (page - 1) * per_page),
+        ).fetchall()
+        return {"decks": [_deck_summary(row) for row in rows], "page": page, "perPage": per_page, "total": total}
+
+    def search_decks(self, text: str, page: int = 1, per_page: int = 20) -> Dict:
+        """Find decks whose cards match every term in ``text``, best match first."""
+        per_page = min(per_page, MAX_PAGE_SIZE)
+        match = _fts_query(text)
+        if not match:
+            return {"decks": [], "page": page, "perPage": per_page, "total": 0}
+
+        conn = self._conn()
+        total = conn.execute(
+            "SELECT COUNT(DISTINCT c.deck_id) FROM cards_fts JOIN cards c ON c.id = cards_fts.rowid "
+            "WHERE cards_fts MATCH ?",
+            (match,),
+        ).fetchone()[0]
+        rows = conn.execute(
+            "SELECT d.*, COUNT(*) AS matches, MIN(cards_fts.rank) AS best "
+            "FROM cards_fts JOIN cards c ON c.id = cards_fts.rowid JOIN decks d ON d.id = c.deck_id "
+            "WHERE cards_fts MATCH ? GROUP BY d.id ORDER BY best LIMIT ? OFFSET ?",
+            (match, per_page, (page - 1) * per_page),
+        ).fetchall()
+
+        decks = []
+        for row in rows:
+            deck = _deck_summary(row)
+            deck["matchCount"] = row["matches"]
+            decks.append(deck)
+        return {"decks": decks, "page": page, "perPage": per_page, "total": total}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_deck_store() -> DeckStore:
+    """Return the process-wide deck store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DeckStore()
+        return _store
@@ -0,0 +1,91 @@
+"""Near-duplicate flashcard elimination.
+
+Gemini often phrases the same question several ways, and merging cards
+from several chunks or files makes that worse. Each card's question is
+reduced to a MinHash signature over character shingles; signatures for
+the whole batch are compared at once in NumPy, so deduplicating a few
+hundred cards is a single vectorized pass.
+"""
+import re
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+
+NUM_PERMUTATIONS = 64
+SHINGLE_SIZE = 4
+# Estimated Jaccard similarity above which two questions are duplicates.
+DEFAULT_THRESHOLD = 0.7
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def _normalize(text: str) -> str:
+    """Lowercase and strip punctuation so trivial rewordings compare equal."""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    """32-bit hashes of the character shingles of ``text``."""
+    text = _normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    return np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+def minhash_signatures(texts: List[str]) -> np.ndarray:
+    """Compute a ``(len(texts), NUM_PERMUTATIONS)`` MinHash signature matrix."""
+    hashes = [_shingle_hashes(text) for text in texts]
+    if not hashes:
+        return np.empty((0, NUM_PERMUTATIONS), dtype=np.uint64)
+
+    # Permute every shingle of every card at once, then take each card's
+    # minimum over its own contiguous run of rows.
+    flat = np.concatenate(hashes)
+    offsets = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+    permuted = (flat[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return np.minimum.reduceat(permuted, offsets, axis=0)
+
+
+def deduplicate_flashcards(cards: List[Dict], threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """Remove near-duplicate flashcards, keeping the first of each group.
+
+    Args:
+        cards: Flashcard dicts with 'front' and 'back' keys
+        threshold: Estimated similarity at or above which cards are duplicates
+
+    Returns:
+        Cards in their original order with near-duplicates removed
+    """
+    if len(cards) < 2:
+        return list(cards)
+
+    signatures = minhash_signatures([card['front'] for card in cards])
+    similarity = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+
+    matches = similarity >= threshold
+
+    # A card is dropped only if it matches an earlier card that was kept;
+    # each step is one vectorized row test, so the Python loop stays linear.
+    keep = np.zeros(len(cards), dtype=bool)
+    for i in range(len(cards)):
+        keep[i] = not matches[i, :i][keep[:i]].any()
+    return [card for card, kept in zip(cards, keep) if kept]
+
+
+def merge_flashcards(*decks: List[Dict], threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """Concatenate several generated decks and deduplicate the result."""
+    return deduplicate_flashcards([card for deck in decks for card in deck], threshold)
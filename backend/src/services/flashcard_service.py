@@ -4,19 +4,51 @@ This service handles all flashcard generation logic including:
 - File upload handling and validation
 - Text extraction from various file types
 - Gemini AI integration
+- Saving each result as a deck, and caching it in the shared cache so a
+  repeated upload is free and returns the same deck
 - Error handling and cleanup
 """
+import hashlib
 import os
+import sqlite3
 import tempfile
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
 from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
+from .cache import get_cache
+from .deck_store import get_deck_store
 from .gemini_client import generate_flashcards_from_file, generate_flashcards_from_text
 
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'ppt', 'pptx', 'txt', 'md', 'jpg', 'jpeg', 'png', 'gif', 'webp'}
 
+# How long generated decks are reused for identical input
+FLASHCARD_CACHE_TTL = 24 * 3600
+
+
+def _flashcard_cache_key(content: bytes, count: int) -> str:
+    """Cache key for the deck generated from ``content``."""
+    return f"flashcard-deck:{count}:{hashlib.sha256(content).hexdigest()}"
+
+
+def _upload_cache_key(file: FileStorage, count: int) -> str:
+    """Cache key for an upload, leaving its stream where it started."""
+    mime_type = file.content_type or 'application/octet-stream'
+    position = file.stream.tell()
+    content = file.stream.read()
+    file.stream.seek(position)
+    return _flashcard_cache_key(content + mime_type.encode(), count)
+
+
+def _cached_flashcards(key: str) -> Optional[Dict]:
+    """Cached deck for ``key``, or None on a miss or cache error."""
+    try:
+        return get_cache().get(key)
+    except Exception as e:
+        print(f"Flashcard cache unavailable: {e}")
+        return None
+
 
 def validate_file(file: FileStorage) -> Tuple[bool, Optional[str]]:
     """Validate uploaded file.
@@ -38,15 +70,42 @@ def validate_file(file: FileStorage) -> Tuple[bool, Optional[str]]:
     return True, None
 
 
-def generate_flashcards_from_upload(file: FileStorage, count: int = 10) -> List[Dict]:
+def _generate_deck(key: str, generate: Callable[[], List[Dict]], source: str, title: str) -> Dict:
+    """Generate flashcards and save them as a deck, once per input.
+
+    The deck id is cached with the cards, so repeating the same input
+    returns the deck saved the first time instead of a duplicate.
+    """
+    attempts, created = [], []
+
+    def create():
+        attempts.append(True)
+        flashcards = generate()
+        deck_id = get_deck_store().save_deck(flashcards, source, title)
+        created.append({"flashcards": flashcards, "deckId": deck_id})
+        return created[-1]
+
+    try:
+        return get_cache().get_or_set(key, create, ttl=FLASHCARD_CACHE_TTL)
+    except (sqlite3.Error, TimeoutError) as e:
+        if attempts and not created:
+            raise  # generation itself failed, not the cache
+        # A cache or lock failure must not cost the deck; generate it directly
+        print(f"Flashcard cache unavailable, generating directly: {e}")
+        return created[-1] if created else create()
+
+
+def generate_flashcards_from_upload(file: FileStorage, count: int = 10, cached_only: bool = False) -> Optional[Dict]:
     """Generate flashcards from an uploaded file.
 
     Args:
         file: Uploaded file (PDF, PPT, image, or text)
         count: Number of flashcards to generate (default: 10)
+        cached_only: Only look the file up in the cache, never call Gemini
 
     Returns:
-        List of flashcard dicts: [{"question": "...", "answer": "..."}, ...]
+        {"flashcards": [{"front": "...", "back": "..."}, ...], "deckId": "..."},
+        or None if ``cached_only`` and the file was not seen recently
 
     Raises:
         ValueError: If file is invalid or count is out of range
@@ -61,6 +120,10 @@ def generate_flashcards_from_upload(file: FileStorage, count: int = 10) -> List[
     if not is_valid:
         raise ValueError(error_msg)
 
+    key = _upload_cache_key(file, count)
+    if cached_only:
+        return _cached_flashcards(key)
+
     # Save to temporary file
     filename = secure_filename(file.filename)
     temp_dir = tempfile.gettempdir()
@@ -72,10 +135,13 @@ def generate_flashcards_from_upload(file: FileStorage, count: int = 10) -> List[
         # Get MIME type
         mime_type = file.content_type or 'application/octet-stream'
 
-        # Generate flashcards using Gemini
-        flashcards = generate_flashcards_from_file(temp_path, mime_type, count)
-
-        return flashcards
+        # Generate flashcards using Gemini, unless this exact file was seen recently
+        return _generate_deck(
+            key,
+            lambda: generate_flashcards_from_file(temp_path, mime_type, count),
+            "file",
+            file.filename,
+        )
 
     except Exception as e:
         raise RuntimeError(f"Failed to generate flashcards: {str(e)}")
@@ -89,15 +155,17 @@ def generate_flashcards_from_upload(file: FileStorage, count: int = 10) -> List[
             pass  # Ignore cleanup errors
 
 
-def generate_flashcards_from_raw_text(text: str, count: int = 10) -> List[Dict]:
+def generate_flashcards_from_raw_text(text: str, count: int = 10, cached_only: bool = False) -> Optional[Dict]:
     """Generate flashcards from raw text input.
 
     Args:
         text: Raw text content
         count: Number of flashcards to generate (default: 10)
+        cached_only: Only look the text up in the cache, never call Gemini
 
     Returns:
-        List of flashcard dicts: [{"question": "...", "answer": "..."}, ...]
+        {"flashcards": [{"front": "...", "back": "..."}, ...], "deckId": "..."},
+        or None if ``cached_only`` and the text was not seen recently
 
     Raises:
         ValueError: If text is empty or count is out of range
@@ -111,10 +179,18 @@ def generate_flashcards_from_raw_text(text: str, count: int = 10) -> List[Dict]:
     if not text or not text.strip():
         raise ValueError("Text cannot be empty")
 
+    key = _flashcard_cache_key(text.encode('utf-8'), count)
+    if cached_only:
+        return _cached_flashcards(key)
+
     try:
-        # Generate flashcards using Gemini
-        flashcards = generate_flashcards_from_text(text, count)
-        return flashcards
+        # Generate flashcards using Gemini, unless this exact text was seen recently
+        return _generate_deck(
+            key,
+            lambda: generate_flashcards_from_text(text, count),
+            "text",
+            text.strip()[:60],
+        )
 
     except Exception as e:
         raise RuntimeError(f"Failed to generate flashcards: {str(e)}")
@@ -15,6 +15,8 @@ from typing import List, Dict
 from pathlib import Path
 import google.generativeai as genai
 from dotenv import load_dotenv
+from .flashcard_dedup import deduplicate_flashcards, merge_flashcards
+from .text_compaction import PAGE_SEPARATOR, compact_text
 
 load_dotenv()
 
@@ -37,7 +39,7 @@ def extract_text_from_pdf(file_path: str) -> str:
                 text = page.extract_text()
                 if text:
                     text_parts.append(text)
-        return "\n\n".join(text_parts)
+        return PAGE_SEPARATOR.join(text_parts)
     except Exception as e:
         raise RuntimeError(f"Failed to extract text from PDF: {e}")
 
@@ -49,10 +51,12 @@ def extract_text_from_pptx(file_path: str) -> str:
         text_parts = []
         prs = Presentation(file_path)
         for slide in prs.slides:
+            slide_parts = []
             for shape in slide.shapes:
                 if hasattr(shape, "text"):
-                    text_parts.append(shape.text)
-        return "\n\n".join(text_parts)
+                    slide_parts.append(shape.text)
+            text_parts.append("\n\n".join(slide_parts))
+        return PAGE_SEPARATOR.join(text_parts)
     except Exception as e:
         raise RuntimeError(f"Failed to extract text from PPTX: {e}")
 
@@ -69,20 +73,52 @@ def process_image_with_gemini(file_path: str, prompt: str) -> str:
         raise RuntimeError(f"Failed to process image with Gemini: {e}")
 
 
+def _parse_flashcards(response_text: str) -> List[Dict]:
+    """Parse a Gemini response into normalized flashcard dicts."""
+    import json
+    import re
+
+    response_text = response_text.strip()
+
+    # Try to find JSON array in response
+    # Remove markdown code blocks if present
+    response_text = re.sub(r'```json\s*', '', response_text)
+    response_text = re.sub(r'```\s*$', '', response_text)
+
+    # Find JSON array, falling back to parsing the whole response
+    match = re.search(r'\[.*\]', response_text, re.DOTALL)
+    flashcards = json.loads(match.group(0) if match else response_text)
+
+    # Validate and normalize
+    validated = []
+    for card in flashcards:
+        if isinstance(card, dict) and 'question' in card and 'answer' in card:
+            validated.append({
+                'front': str(card['question']).strip(),
+                'back': str(card['answer']).strip()
+            })
+    return validated
+
+
 def generate_flashcards_from_text(text: str, count: int = 10, model_name: str = DEFAULT_MODEL) -> List[Dict]:
     """Generate flashcards from text using Gemini.
 
+    Near-duplicate cards are removed; if that leaves fewer than ``count``,
+    one follow-up request asks for the missing cards.
+
     Args:
         text: Source text to generate flashcards from
         count: Number of flashcards to generate
         model_name: Gemini model to use
 
     Returns:
-        List of dicts with 'question' and 'answer' keys
+        List of dicts with 'front' and 'back' keys
     """
     if not GOOGLE_API_KEY:
         raise RuntimeError("GOOGLE_API_KEY not set in environment")
 
+    content = compact_text(text)
+
     # Construct prompt
     prompt = f"""You are an expert educator creating study flashcards.
 
@@ -96,52 +132,38 @@ Requirements:
 - Do not include any markdown formatting, code blocks, or additional text
 
 Content:
-{text[:8000]}
+{content}
 
 Generate {count} flashcards as a JSON array:"""
 
     try:
         model = genai.GenerativeModel(model_name)
         response = model.generate_content(prompt)
+        flashcards = deduplicate_flashcards(_parse_flashcards(response.text))
 
-        # Extract JSON from response
-        import json
-        import re
+        missing = count - len(flashcards)
+        if missing > 0 and flashcards:
+            existing = "\n".join(f"- {card['front']}" for card in flashcards)
+            follow_up = f"""You are an expert educator creating study flashcards.
 
-        response_text = response.text.strip()
+From the content below, create exactly {missing} more flashcards. Each must cover something
+different from these existing questions:
+{existing}
 
-        # Try to find JSON array in response
-        # Remove markdown code blocks if present
-        response_text = re.sub(r'```json\s*', '', response_text)
-        response_text = re.sub(r'```\s*$', '', response_text)
+Return ONLY a valid JSON array with this exact format: [{{"question": "...", "answer": "..."}}, ...]
 
-        # Find JSON array
-        match = re.search(r'\[.*\]', response_text, re.DOTALL)
-        if match:
-            json_str = match.group(0)
-            flashcards = json.loads(json_str)
-
-            # Validate and normalize
-            validated = []
-            for card in flashcards:
-                if isinstance(card, dict) and 'question' in card and 'answer' in card:
-                    validated.append({
-                        'front': str(card['question']).strip(),
-                        'back': str(card['answer']).strip()
-                    })
-
-            return validated[:count]
-        else:
-            # Fallback: try parsing the whole response
-            flashcards = json.loads(response_text)
-            validated = []
-            for card in flashcards:
-                if isinstance(card, dict) and 'question' in card and 'answer' in card:
-                    validated.append({
-                        'front': str(card['question']).strip(),
-                        'back': str(card['answer']).strip()
-                    })
-            return validated[:count]
+Content:
+{content}
+
+Generate {missing} flashcards as a JSON array:"""
+            # The top-up is best effort; the cards from the first pass stand on their own
+            try:
+                response = model.generate_content(follow_up)
+                flashcards = merge_flashcards(flashcards, _parse_flashcards(response.text))
+            except Exception as e:
+                print(f"Error generating follow-up flashcards: {e}")
+
+        return flashcards[:count]
 
     except Exception as e:
         raise RuntimeError(f"Failed to generate flashcards with Gemini: {e}")
@@ -183,11 +205,10 @@ Return ONLY a JSON array: [{{"question": "...", "answer": "..."}}, ...]"""
         response = process_image_with_gemini(file_path, prompt)
 
         # Parse JSON from response
-        import json
         import re
         match = re.search(r'\[.*\]', response, re.DOTALL)
         if match:
-            return json.loads(match.group(0))[:count]
+            return deduplicate_flashcards(_parse_flashcards(match.group(0)))[:count]
         else:
             # If Gemini didn't return structured data, extract text and regenerate
             text_prompt = "Extract all text and information from this image as plain text."
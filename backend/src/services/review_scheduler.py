@@ -0,0 +1,209 @@
+"""Spaced-repetition review scheduling (SM-2).
+
+Each saved card gets one compact row of scheduling state, stored in the
+deck database next to the cards themselves:
+
+- ``due``: next review time, epoch seconds
+- ``interval``: current interval, days
+- ``repetitions``: successful reviews in a row
+- ``ease``: SM-2 ease factor in thousandths (2500 = 2.5)
+- ``lapses``: times the card was forgotten
+
+An index on ``due`` (and on ``deck_id, due``) makes the table a due-date
+priority queue: fetching the next N due cards and rescheduling a card are
+both O(log n) B-tree operations, however many cards are stored.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .deck_store import DECK_DB_PATH, SCHEMA as DECK_SCHEMA, connect
+
+
+DAY_SECONDS = 86400
+MIN_EASE = 1300
+MAX_DUE_LIMIT = 100
+# Kept under SQLite's historical 999 bound-parameter limit.
+MAX_RESULTS_PER_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_state (
+    card_id INTEGER PRIMARY KEY REFERENCES cards (id) ON DELETE CASCADE,
+    deck_id TEXT NOT NULL,
+    due INTEGER NOT NULL,
+    interval INTEGER NOT NULL DEFAULT 0,
+    repetitions INTEGER NOT NULL DEFAULT 0,
+    ease INTEGER NOT NULL DEFAULT 2500,
+    lapses INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS review_state_due ON review_state (due);
+CREATE INDEX IF NOT EXISTS review_state_deck_due ON review_state (deck_id, due);
+
+CREATE TRIGGER IF NOT EXISTS review_state_enroll AFTER INSERT ON cards BEGIN
+    INSERT OR IGNORE INTO review_state (card_id, deck_id, due)
+    VALUES (new.id, new.deck_id, CAST(strftime('%s', 'now') AS INTEGER));
+END;
+
+-- Enroll cards saved before the scheduler existed.
+INSERT OR IGNORE INTO review_state (card_id, deck_id, due)
+SELECT id, deck_id, CAST(strftime('%s', 'now') AS INTEGER) FROM cards;
+"""
+
+
+def sm2(repetitions: int, interval: int, ease: int, quality: int) -> Tuple[int, int, int, bool]:
+    """Apply one SM-2 review.
+
+    Args:
+        repetitions: Successful reviews in a row so far
+        interval: Current interval in days
+        ease: Ease factor in thousandths
+        quality: Recall quality from 0 (blackout) to 5 (perfect)
+
+    Returns:
+        Tuple of (repetitions, interval, ease, lapsed)
+    """
+    if quality < 3:
+        repetitions, interval, lapsed = 0, 1, True
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = 1
+        elif repetitions == 2:
+            interval = 6
+        else:
+            interval = round(interval * ease / 1000)
+        lapsed = False
+
+    miss = 5 - quality
+    ease = max(MIN_EASE, ease + 100 - miss * (80 + miss * 20))
+    return repetitions, interval, ease, lapsed
+
+
+class ReviewScheduler:
+    """Due-card queue and review bookkeeping on top of the deck database."""
+
+    def __init__(self, path: str = DECK_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with connect(path) as conn:
+            conn.executescript(DECK_SCHEMA)
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def due_cards(self, limit: int = 20, deck_id: Optional[str] = None, now: Optional[float] = None) -> List[Dict]:
+        """Return up to ``limit`` cards due for review, most overdue first."""
+        limit = min(limit, MAX_DUE_LIMIT)
+        now = int(now if now is not None else time.time())
+        query = (
+            "SELECT r.card_id, r.deck_id, r.due, r.interval, r.repetitions, c.front, c.back "
+            "FROM review_state r JOIN cards c ON c.id = r.card_id "
+        )
+        if deck_id:
+            rows = self._conn().execute(
+                query + "WHERE r.deck_id = ? AND r.due <= ? ORDER BY r.due LIMIT ?",
+                (deck_id, now, limit),
+            )
+        else:
+            rows = self._conn().execute(
+                query + "WHERE r.due <= ? ORDER BY r.due LIMIT ?",
+                (now, limit),
+            )
+        return [
+            {
+                "cardId": row["card_id"],
+                "deckId": row["deck_id"],
+                "front": row["front"],
+                "back": row["back"],
+                "due": row["due"],
+                "interval": row["interval"],
+                "repetitions": row["repetitions"],
+            }
+            for row in rows
+        ]
+
+    def submit_results(self, results: List[Dict], now: Optional[float] = None) -> Dict:
+        """Record a batch of reviews in one transaction.
+
+        Args:
+            results: Dicts with 'cardId' and 'quality' (0-5)
+            now: Review time in epoch seconds (default: current time)
+
+        Returns:
+            Dict with the new schedule of each reviewed card and the ids of
+            cards that were not found
+
+        Raises:
+            ValueError: If the batch is too large or a result is malformed
+        """
+        if len(results) > MAX_RESULTS_PER_BATCH:
+            raise ValueError(f"At most {MAX_RESULTS_PER_BATCH} results per batch")
+        reviews = []
+        for result in results:
+            if not isinstance(result, dict):
+                raise ValueError("Each result must be an object")
+            card_id, quality = result.get("cardId"), result.get("quality")
+            # JSON true/false arrive as bool, which is an int subclass
+            if not all(isinstance(v, int) and not isinstance(v, bool) for v in (card_id, quality)) or not 0 <= quality <= 5:
+                raise ValueError("Each result needs an integer cardId and a quality between 0 and 5")
+            reviews.append((card_id, quality))
+
+        now = int(now if now is not None else time.time())
+        conn = self._conn()
+        with conn:
+            # Take the write lock before reading, so concurrent submissions
+            # for the same card are applied one after the other.
+            conn.execute("BEGIN IMMEDIATE")
+            # Later results for the same card build on earlier ones.
+            states = {}
+            card_ids = list({card_id for card_id, _ in reviews})
+            placeholders = ",".join("?" * len(card_ids))
+            for row in conn.execute(
+                f"SELECT card_id, interval, repetitions, ease, lapses FROM review_state "
+                f"WHERE card_id IN ({placeholders})",
+                card_ids,
+            ):
+                states[row["card_id"]] = [row["repetitions"], row["interval"], row["ease"], row["lapses"]]
+
+            unknown = []
+            for card_id, quality in reviews:
+                state = states.get(card_id)
+                if state is None:
+                    unknown.append(card_id)
+                    continue
+                repetitions, interval, ease, lapsed = sm2(state[0], state[1], state[2], quality)
+                state[:] = [repetitions, interval, ease, state[3] + lapsed]
+
+            conn.executemany(
+                "UPDATE review_state SET repetitions = ?, interval = ?, ease = ?, lapses = ?, due = ? "
+                "WHERE card_id = ?",
+                [
+                    (reps, interval, ease, lapses, now + interval * DAY_SECONDS, card_id)
+                    for card_id, (reps, interval, ease, lapses) in states.items()
+                ],
+            )
+
+        return {
+            "updated": [
+                {"cardId": card_id, "due": now + interval * DAY_SECONDS, "interval": interval}
+                for card_id, (_, interval, _, _) in states.items()
+            ],
+            "unknown": unknown,
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_review_scheduler() -> ReviewScheduler:
+    """Return the process-wide review scheduler, creating it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ReviewScheduler()
+        return _scheduler
@@ -0,0 +1,209 @@
+"""Prompt compaction for extracted document text.
+
+Text pulled out of PDFs and slide decks is noisy: running headers and
+footers repeat on every page, page numbers sit on their own lines, words
+are hyphenated across line breaks and whitespace comes in long runs.
+This module cleans that up and trims the result to a token budget so the
+Gemini prompt carries as much actual content as possible.
+
+Pages (or slides) are expected to be separated by a form feed (``\\f``),
+which is what the extractors in ``gemini_client`` emit.
+"""
+import os
+import re
+from collections import Counter
+from typing import List, Set, Tuple
+
+
+PAGE_SEPARATOR = "\f"
+
+# Default prompt budget for source content, in estimated tokens.
+DEFAULT_TOKEN_BUDGET = int(os.getenv("GEMINI_CONTENT_TOKEN_BUDGET", "2000"))
+
+# A line near the top or bottom of a page must appear on at least this
+# share of pages (and on at least MIN_BOILERPLATE_PAGES pages) to be
+# treated as a header/footer.
+BOILERPLATE_PAGE_RATIO = 0.5
+MIN_BOILERPLATE_PAGES = 3
+BOILERPLATE_EDGE_LINES = 3
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_HYPHEN_BREAK = re.compile(r"([a-z])-\n\s*([a-z])")
+_INLINE_SPACE = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_WORD = re.compile(r"\S+\s*")
+_SENTENCE_END = re.compile(r"[.!?](?=\s)")
+_DIGITS = re.compile(r"\d+")
+_PAGE_NUMBER = re.compile(
+    r"^(page\s+)?\d+(\s*(of|/)\s*\d+)?$|^[-–—]\s*\d+\s*[-–—]$",
+    re.IGNORECASE,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate how many model tokens ``text`` will use.
+
+    Counts words and punctuation marks, charging long words one token per
+    four characters to mimic subword tokenization. Cheap, and close enough
+    to budget a prompt without calling the API.
+    """
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_PATTERN.findall(text))
+
+
+def _line_key(line: str) -> str:
+    """Key used to spot repeated lines."""
+    return line.strip().lower()
+
+
+def _edge_lines(lines: List[str]) -> List[str]:
+    """Non-empty lines at the top and bottom of a page, where headers live."""
+    content = [line for line in lines if line]
+    if len(content) <= 2 * BOILERPLATE_EDGE_LINES:
+        return content
+    return content[:BOILERPLATE_EDGE_LINES] + content[-BOILERPLATE_EDGE_LINES:]
+
+
+def _page_number_lines(pages: List[List[str]]) -> Set[Tuple[int, int]]:
+    """Positions (page, line) of page numbers.
+
+    A page number is the first or last non-empty line of its page, and
+    the numbers at that position must increase from page to page on at
+    least half of the pages. Numbers that are slide content, like an
+    answer on a short slide, do not follow such a sequence.
+    """
+    for position in (0, -1):
+        found = []
+        for page_index, lines in enumerate(pages):
+            content = [i for i, line in enumerate(lines) if line]
+            if not content:
+                continue
+            line_index = content[position]
+            if _PAGE_NUMBER.match(lines[line_index]):
+                number = int(_DIGITS.search(lines[line_index]).group(0))
+                found.append((page_index, line_index, number))
+
+        numbers = [number for _, _, number in found]
+        increasing = all(a < b for a, b in zip(numbers, numbers[1:]))
+        if increasing and len(found) >= max(2, len(pages) * BOILERPLATE_PAGE_RATIO):
+            return {(page_index, line_index) for page_index, line_index, _ in found}
+    return set()
+
+
+def _remove_boilerplate(pages: List[List[str]]) -> List[List[str]]:
+    """Drop page numbers and header/footer lines repeated across pages.
+
+    Only the lines at the top and bottom of each page are candidates, and
+    nothing is dropped from single-page input such as pasted notes.
+    """
+    if len(pages) < 2:
+        return pages
+
+    page_numbers = _page_number_lines(pages)
+
+    threshold = max(MIN_BOILERPLATE_PAGES, int(len(pages) * BOILERPLATE_PAGE_RATIO))
+    counts = Counter()
+    for lines in pages:
+        counts.update({_line_key(line) for line in _edge_lines(lines)})
+    repeated = {key for key, seen in counts.items() if seen >= threshold}
+
+    cleaned = []
+    for page_index, lines in enumerate(pages):
+        edges = set(_edge_lines(lines))
+        kept = []
+        for line_index, line in enumerate(lines):
+            if (page_index, line_index) in page_numbers:
+                continue
+            if line in edges and _line_key(line) in repeated:
+                continue
+            kept.append(line)
+        cleaned.append(kept)
+    return cleaned
+
+
+def normalize_text(text: str) -> str:
+    """Normalize extracted text without changing its content.
+
+    Re-joins words hyphenated across line breaks, removes headers, footers
+    and page numbers, collapses whitespace runs and merges pages.
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _HYPHEN_BREAK.sub(r"\1\2", text)
+
+    pages = [
+        [_INLINE_SPACE.sub(" ", line).strip() for line in page.split("\n")]
+        for page in text.split(PAGE_SEPARATOR)
+    ]
+    pages = _remove_boilerplate(pages)
+
+    text = "\n\n".join("\n".join(lines).strip() for lines in pages)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def _truncate_by_chars(piece: str, budget: int) -> str:
+    """Longest prefix of ``piece`` within ``budget`` tokens, at least one character."""
+    low, high = 1, len(piece)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(piece[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return piece[:low]
+
+
+def _truncate_paragraph(paragraph: str, budget: int) -> str:
+    """Cut a paragraph to ``budget`` tokens at a sentence, else word, boundary.
+
+    Text with no usable word boundary (e.g. CJK, or one very long token)
+    is cut by characters instead of being dropped.
+    """
+    kept, used = [], 0
+    for match in _WORD.finditer(paragraph):
+        piece = match.group(0)
+        cost = estimate_tokens(piece)
+        if used + cost > budget:
+            if not kept and budget > 0:
+                kept.append(_truncate_by_chars(piece, budget))
+            break
+        kept.append(piece)
+        used += cost
+    truncated = "".join(kept).rstrip()
+
+    sentence_ends = [m.end() for m in _SENTENCE_END.finditer(truncated + " ")]
+    if sentence_ends and sentence_ends[-1] >= len(truncated) // 2:
+        return truncated[:sentence_ends[-1]]
+    return truncated
+
+
+def fit_to_token_budget(text: str, budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    """Trim ``text`` to at most ``budget`` estimated tokens.
+
+    Whole paragraphs are kept while they fit; the first one that does not
+    is cut at a sentence or word boundary.
+    """
+    kept, used = [], 0
+    for paragraph in text.split("\n\n"):
+        cost = estimate_tokens(paragraph)
+        if used + cost <= budget:
+            kept.append(paragraph)
+            used += cost
+            continue
+        # Never return nothing for non-empty input, even with a tiny budget
+        remainder = _truncate_paragraph(paragraph, budget - used if kept else max(budget, 1))
+        if remainder:
+            kept.append(remainder)
+        break
+    return "\n\n".join(kept)
+
+
+def compact_text(text: str, budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    """Normalize extracted text and fit it to a prompt token budget.
+
+    Args:
+        text: Raw extracted text, pages separated by form feeds
+        budget: Maximum number of estimated tokens to keep
+
+    Returns:
+        Cleaned text no longer than ``budget`` estimated tokens
+    """
+    return fit_to_token_budget(normalize_text(text), budget)
@@ -1,20 +1,58 @@
 from flask import Blueprint, request, send_from_directory, make_response, jsonify, abort
-from elevenz import start_sound, end_sound
+from elevenz import start_sound, end_sound, session_sounds, prefetch_sound, get_voice_catalog, is_known_voice, voice_settings_from_request
 import os
 from pathlib import Path
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
+from admission import Overloaded, admit, overloaded_response
+from profiling import profiled
 from services.flashcard_service import generate_flashcards_from_upload, generate_flashcards_from_raw_text, validate_file
+from services.audio_encoding import AUDIO_FORMATS, DEFAULT_FORMAT, negotiate_format, variant_filename
+from services.deck_store import get_deck_store
+from services.review_scheduler import get_review_scheduler
 
 views = Blueprint("views", __name__)
+views.register_error_handler(Overloaded, overloaded_response)
 
 @views.route('/audio_files/<path:filename>', methods=['GET'])
 def serve_audio_file(filename):
     audio_dir = os.path.join(os.path.dirname(__file__), '..', 'audio_files')
-    response = send_from_directory(audio_dir, filename)
+    accepted = [mimetype for mimetype, quality in request.accept_mimetypes if quality > 0]
+    save_data = request.headers.get('Save-Data', '').lower() == 'on'
+    fmt = negotiate_format(request.args.get('format'), accepted, save_data)
+
+    served, mimetype = filename, None
+    if filename.endswith('.mp3') and fmt != DEFAULT_FORMAT:
+        variant = variant_filename(filename, fmt)
+        variant_path = safe_join(audio_dir, variant)
+        if variant_path and os.path.isfile(variant_path):
+            served, mimetype = variant, AUDIO_FORMATS[fmt]["mimetype"]
+
+    response = send_from_directory(audio_dir, served, mimetype=mimetype)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Vary'] = 'Accept, Save-Data'
+    return response
+
+def _voice_args():
+    """Validated voice ID and VoiceSettings from a pomodoro request body."""
+    data = request.get_json(silent=True) or {}
+    voice_id = data.get("voiceId") or data.get("voice_id")
+    settings = data.get("voiceSettings") or {}
+    if not isinstance(settings, dict):
+        raise ValueError("voiceSettings must be an object")
+    if voice_id and not is_known_voice(voice_id):
+        raise ValueError(f"Unknown voiceId: {voice_id}")
+    return voice_id, voice_settings_from_request(settings)
+
+@views.route('/api/voices', methods=["GET"])
+@profiled
+def list_voices():
+    response = jsonify({"voices": get_voice_catalog()})
     response.headers['Access-Control-Allow-Origin'] = '*'
     return response
 
 @views.route('/api/pomodoro-start', methods=["POST", "OPTIONS"])
+@profiled
 def start_session():
     if request.method == 'OPTIONS':
         response = make_response('')
@@ -23,18 +61,26 @@ def start_session():
         response.headers['Access-Control-Allow-Methods'] = 'POST,OPTIONS'
         return response
 
-    data = request.get_json(silent=True) or {}
-    voice_id = data.get("voiceId") or data.get("voice_id")
-    voice_settings = data.get("voiceSettings") or {}
-    path, file_name = start_sound(voice_id=voice_id)
+    try:
+        voice_id, voice_settings = _voice_args()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    # Stored clips are cheap to return and skip admission control
+    path, file_name = start_sound(voice_id=voice_id, voice_settings=voice_settings, cached_only=True)
+    if not path:
+        with admit("pomodoro"):
+            path, file_name = start_sound(voice_id=voice_id, voice_settings=voice_settings)
     if not path:
         abort(404, description="Audio not generated.")
+    # The end clip for this voice is almost always requested next
+    prefetch_sound(end_sound, voice_id=voice_id, voice_settings=voice_settings)
     url = request.host_url.rstrip("/") + "/audio_files/" + file_name
     response = jsonify({"audioUrl": url})
     response.headers['Access-Control-Allow-Origin'] = '*'
     return response
 
 @views.route('/api/pomodoro-end', methods=["POST", "OPTIONS"])
+@profiled
 def end_session():
     if request.method == 'OPTIONS':
         response = make_response('')
@@ -42,23 +88,56 @@ def end_session():
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization'
         response.headers['Access-Control-Allow-Methods'] = 'POST,OPTIONS'
         return response
-    data = request.get_json(silent=True) or {}
-    voice_id = data.get("voiceId") or data.get("voice_id")
-    voice_settings = data.get("voiceSettings") or {}
-    path, file_name = end_sound(voice_id=voice_id)
+    try:
+        voice_id, voice_settings = _voice_args()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    # Stored clips are cheap to return and skip admission control
+    path, file_name = end_sound(voice_id=voice_id, voice_settings=voice_settings, cached_only=True)
+    if not path:
+        with admit("pomodoro"):
+            path, file_name = end_sound(voice_id=voice_id, voice_settings=voice_settings)
     if not path:
         abort(404, description="Audio not generated.")
+    # Have the start clip ready for the next session
+    prefetch_sound(start_sound, voice_id=voice_id, voice_settings=voice_settings)
     url = request.host_url.rstrip("/") + "/audio_files/" + file_name
     response = jsonify({"audioUrl": url})
     response.headers['Access-Control-Allow-Origin'] = '*'
     return response
 
+@views.route('/api/pomodoro-session', methods=["POST", "OPTIONS"])
+@profiled
+def session_audio():
+    if request.method == 'OPTIONS':
+        response = make_response('')
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization'
+        response.headers['Access-Control-Allow-Methods'] = 'POST,OPTIONS'
+        return response
+    try:
+        voice_id, voice_settings = _voice_args()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    # Stored clips are cheap to return and skip admission control
+    (start_path, start_name), (end_path, end_name) = session_sounds(voice_id, voice_settings, cached_only=True)
+    if not start_path or not end_path:
+        with admit("pomodoro"):
+            (start_path, start_name), (end_path, end_name) = session_sounds(voice_id, voice_settings)
+    if not start_path or not end_path:
+        abort(404, description="Audio not generated.")
+    base_url = request.host_url.rstrip("/") + "/audio_files/"
+    response = jsonify({"startAudioUrl": base_url + start_name, "endAudioUrl": base_url + end_name})
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
 def _check_ext(filename):
     allowed = ["ppt","png","pdf","pptx","jpg","jpeg","txt","md","gif","webp"]
     ext = Path(filename).suffix.lower().lstrip('.')
     return ext in allowed
 
 @views.route('/api/generate-flashcards', methods=["POST", "OPTIONS"])
+@profiled
 def generate_flashcards():
     if request.method == 'OPTIONS':
         response = make_response('')
@@ -94,11 +173,16 @@ def generate_flashcards():
             if not text_input.strip():
                 return jsonify({"error": "Text input cannot be empty"}), 400
 
-            flashcards = generate_flashcards_from_raw_text(text_input, count)
+            # Recently generated cards are cheap to return and skip admission control
+            deck = generate_flashcards_from_raw_text(text_input, count, cached_only=True)
+            if deck is None:
+                with admit("flashcards"):
+                    deck = generate_flashcards_from_raw_text(text_input, count)
             return jsonify({
-                "flashcards": flashcards,
-                "count": len(flashcards),
-                "source": "text"
+                "flashcards": deck["flashcards"],
+                "count": len(deck["flashcards"]),
+                "source": "text",
+                "deckId": deck["deckId"]
             }), 200
 
         # Case 2: File upload
@@ -114,17 +198,89 @@ def generate_flashcards():
         if not is_valid:
             return jsonify({"error": error_msg}), 400
 
-        # Generate flashcards
-        flashcards = generate_flashcards_from_upload(file, count)
+        # Generate flashcards, unless this file was seen recently
+        deck = generate_flashcards_from_upload(file, count, cached_only=True)
+        if deck is None:
+            with admit("flashcards"):
+                deck = generate_flashcards_from_upload(file, count)
 
         return jsonify({
-            "flashcards": flashcards,
-            "count": len(flashcards),
+            "flashcards": deck["flashcards"],
+            "count": len(deck["flashcards"]),
             "source": "file",
-            "filename": file.filename
+            "filename": file.filename,
+            "deckId": deck["deckId"]
         }), 200
 
     except ValueError as e:
         return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    except Overloaded:
+        raise
     except Exception as e:
         return jsonify({"error": "Failed to generate flashcards", "detail": str(e)}), 500
+
+
+def _page_args():
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("perPage", 20, type=int)
+    if page < 1 or per_page < 1:
+        raise ValueError("page and perPage must be positive")
+    return page, per_page
+
+@views.route('/api/decks', methods=["GET"])
+@profiled
+def list_decks():
+    try:
+        page, per_page = _page_args()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    return jsonify(get_deck_store().list_decks(page, per_page)), 200
+
+@views.route('/api/decks/search', methods=["GET"])
+@profiled
+def search_decks():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Search query cannot be empty"}), 400
+    try:
+        page, per_page = _page_args()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+    return jsonify(get_deck_store().search_decks(query, page, per_page)), 200
+
+@views.route('/api/decks/<deck_id>', methods=["GET"])
+@profiled
+def get_deck(deck_id):
+    deck = get_deck_store().get_deck(deck_id)
+    if deck is None:
+        return jsonify({"error": "Deck not found"}), 404
+    return jsonify(deck), 200
+
+@views.route('/api/review/due', methods=["GET"])
+@profiled
+def due_cards():
+    limit = request.args.get("limit", 20, type=int)
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    deck_id = request.args.get("deckId")
+    cards = get_review_scheduler().due_cards(limit, deck_id)
+    return jsonify({"cards": cards, "count": len(cards)}), 200
+
+@views.route('/api/review/results', methods=["POST", "OPTIONS"])
+@profiled
+def submit_review_results():
+    if request.method == 'OPTIONS':
+        response = make_response('')
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization'
+        response.headers['Access-Control-Allow-Methods'] = 'POST,OPTIONS'
+        return response
+
+    data = request.get_json(silent=True) or {}
+    results = data.get("results")
+    if not isinstance(results, list) or not results:
+        return jsonify({"error": "results must be a non-empty list"}), 400
+    try:
+        return jsonify(get_review_scheduler().submit_results(results)), 200
+    except ValueError as e:
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
@@ -8,8 +8,7 @@ import type { StudySettings } from './types/settings';
 import type { AudioConfig } from './api/audioApi';
 import {
   defaultAudioConfig,
-  fetchPomodoroStartAudio,
-  fetchPomodoroEndAudio
+  fetchPomodoroSessionAudio
 } from './api/audioApi';
 
 export default function App() {
@@ -67,13 +66,10 @@ export default function App() {
     let isActive = true;
     async function updateAudio() {
       const config: AudioConfig = settings.voiceSettings || defaultAudioConfig;
-      const [start, end] = await Promise.all([
-        fetchPomodoroStartAudio(config),
-        fetchPomodoroEndAudio(config)
-      ]);
+      const { startUrl, endUrl } = await fetchPomodoroSessionAudio(config);
       if (isActive) {
-        setAudioStartUrl(start);
-        setAudioEndUrl(end);
+        setAudioStartUrl(startUrl);
+        setAudioEndUrl(endUrl);
       }
     }
     updateAudio();
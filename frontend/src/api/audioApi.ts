@@ -16,6 +16,15 @@ export const defaultAudioConfig: AudioConfig = {
     speakerBoost: true,
 };
 
+// Ask for the compact Opus variant when the browser can play it.
+function withPreferredFormat(url: string): string {
+    const audio = document.createElement('audio');
+    if (audio.canPlayType('audio/ogg; codecs="opus"')) {
+        return `${url}?format=opus`;
+    }
+    return url;
+}
+
 function mapAudioConfigForApi(config: AudioConfig) {
     return {
         voiceId: config.voiceId,
@@ -41,7 +50,7 @@ export async function fetchPomodoroStartAudio(
         if (!resp.ok) throw new Error('Failed to fetch start audio');
         const data = await resp.json();
         console.log(data);
-        return data.audioUrl as string;
+        return withPreferredFormat(data.audioUrl as string);
     } catch (err) {
         console.error('Start audio fetch error:', err);
         return null;
@@ -60,9 +69,36 @@ export async function fetchPomodoroEndAudio(
         if (!resp.ok) throw new Error('Failed to fetch end audio');
         const data = await resp.json();
         console.log(data);
-        return data.audioUrl as string;
+        return withPreferredFormat(data.audioUrl as string);
     } catch (err) {
         console.error('End audio fetch error:', err);
         return null;
     }
 }
+
+export interface SessionAudio {
+    startUrl: string | null;
+    endUrl: string | null;
+}
+
+// Fetches both clips in one request; the backend generates them in parallel.
+export async function fetchPomodoroSessionAudio(
+    config: AudioConfig = defaultAudioConfig
+): Promise<SessionAudio> {
+    try {
+        const resp = await fetch('http://localhost:8001/api/pomodoro-session', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(mapAudioConfigForApi(config)),
+        });
+        if (!resp.ok) throw new Error('Failed to fetch session audio');
+        const data = await resp.json();
+        return {
+            startUrl: withPreferredFormat(data.startAudioUrl as string),
+            endUrl: withPreferredFormat(data.endAudioUrl as string),
+        };
+    } catch (err) {
+        console.error('Session audio fetch error:', err);
+        return { startUrl: null, endUrl: null };
+    }
+}